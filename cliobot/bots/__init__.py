@@ -1,17 +1,46 @@
 import asyncio
-import os
+import collections
+import contextvars
+import functools
+import logging
 import queue
 import threading
 import traceback
+import types
+from concurrent.futures import ThreadPoolExecutor
 from sys import exc_info
-from typing import Callable
+from typing import Callable, Mapping
 
+from cliobot.bots.inbox import Inbox
 from cliobot.cache import InMemoryCache
 from cliobot.errors import BaseErrorHandler
 from cliobot.metrics import BaseMetrics
+from cliobot.translator import NullTranslator
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _run_in_executor(loop, func, *args, **kwargs) -> asyncio.Future:
+    """
+    like asyncio.to_thread, but skips the contextvars copy + ctx.run wrapper when there's nothing in the context
+    """
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+
+    ctx = contextvars.copy_context()
+    if not ctx:
+        return loop.run_in_executor(None, func, *args)
+    return loop.run_in_executor(None, functools.partial(ctx.run, func, *args))
 
 
 class Message:
+    __slots__ = ('user', 'bot_id', 'message_id', 'user_id', 'chat_id', 'reply_to_message_id', 'text',
+                 'reply_to_message', 'image', 'video', 'audio', 'metadata', 'is_forward', 'voice')
+
+    # recycled instances, see acquire() / release()
+    _pool = collections.deque(maxlen=256)
+
     def __init__(self,
                  message_id,
                  user_id,
@@ -30,6 +59,8 @@ class Message:
                  ):
         if metadata is None:
             metadata = {}
+        if reply_to_message is not None and not reply_to_message_id:
+            reply_to_message_id = reply_to_message.message_id
 
         self.user = user
         self.bot_id = bot_id
@@ -46,8 +77,43 @@ class Message:
         self.is_forward = is_forward
         self.voice = voice
 
-        if self.reply_to_message and not self.reply_to_message_id:
-            self.reply_to_message_id = self.reply_to_message.message_id
+    @classmethod
+    def acquire(cls, **kwargs) -> 'Message':
+        """
+        same as Message(**kwargs), but reuses a released instance (and its metadata dict) when there's one around
+        """
+        try:
+            message = cls._pool.pop()
+        except IndexError:
+            return cls(**kwargs)
+
+        if kwargs.get('metadata') is None:
+            kwargs['metadata'] = message.metadata  # already cleared on release
+        message.__init__(**kwargs)
+        return message
+
+    def release(self):
+        """
+        hand the instance back to the pool. The message must not be used after this
+        """
+        if isinstance(self.reply_to_message, Message):
+            self.reply_to_message.release()
+
+        self.metadata.clear()
+        self.user = None
+        self.bot_id = None
+        self.message_id = None
+        self.user_id = None
+        self.chat_id = None
+        self.reply_to_message_id = None
+        self.text = None
+        self.reply_to_message = None
+        self.image = None
+        self.video = None
+        self.audio = None
+        self.is_forward = False
+        self.voice = None
+        Message._pool.append(self)
 
     def translate(self, translator):
         if self.text is not None and translator:
@@ -64,6 +130,8 @@ class Message:
 
 
 class User:
+    __slots__ = ('username', 'phone', 'full_name', 'language')
+
     def __init__(self, username, phone, full_name, language):
         self.username = username
         self.phone = phone
@@ -71,38 +139,84 @@ class User:
         self.language = language
 
 
+# context keys holding files, see Session.images() / Session.audios()
+IMAGE_SUFFIX = '_image'
+AUDIO_SUFFIX = '_audio'
+
+
 # context = the "short term memory" of the bot. It survives across requests until cleared
 # preferences = the "long term memory" of the bot. It survives until a user logs off
 class Session:
+    __slots__ = ('user_id', 'chat_id', 'preferences', '_images', '_audios', '_other', '_context')
+
     def __init__(self, user_id, chat_id, context, preferences):
         self.user_id = user_id
         self.chat_id = chat_id
-        self.preferences = {}
         self.context = context
         self.preferences = preferences
 
+    # the context is kept split by kind, so images()/audios() don't need to scan it
+    @property
+    def context(self) -> Mapping:
+        """
+        a live, read-only view over the whole context. Use set()/pop()/clear() to change it
+        """
+        return self._context
+
+    @context.setter
+    def context(self, context):
+        self._images = {}
+        self._audios = {}
+        self._other = {}
+        self._context = types.MappingProxyType(collections.ChainMap(self._other, self._images, self._audios))
+        for k, v in (context or {}).items():
+            self._bucket(k, v)[k] = v
+
+    def _bucket(self, key, value) -> dict:
+        if value is not None:
+            if key.endswith(IMAGE_SUFFIX):
+                return self._images
+            if key.endswith(AUDIO_SUFFIX):
+                return self._audios
+        return self._other
+
+    def _find(self, key):
+        for bucket in (self._other, self._images, self._audios):
+            if key in bucket:
+                return bucket
+        return None
+
+    def _peek(self, key, default=None):
+        bucket = self._find(key)
+        return default if bucket is None else bucket[key]
+
     def pop(self, key):
-        if key in self.context:
-            return self.context.pop(key)
+        bucket = self._find(key)
+        if bucket is not None:
+            return bucket.pop(key)
         return None
 
     def __str__(self):
-        return f"Session({self.context}, {self.preferences})"
+        return f"Session({dict(self.context)}, {self.preferences})"
 
     def __repr__(self):
         return self.__str__()
 
     def set(self, key, value):
-        print('setting', key, value)
-        self.context[key] = value
+        logger.debug('setting %s %s', key, value)
+        bucket = self._bucket(key, value)
+        current = self._find(key)
+        if current is not None and current is not bucket:
+            current.pop(key)
+        bucket[key] = value
 
     def get(self, key, default=None, include_preferences=True):
-        res = self.context.get(key, None)
+        res = self._peek(key)
 
-        if not res and include_preferences:
-            res = self.preferences.get(key, default)
+        if res is None and include_preferences:
+            res = self.preferences.get(key)
 
-        return res or default
+        return default if res is None else res
 
     def clear(self, clear_user=False):
         newc = {}
@@ -113,66 +227,78 @@ class Session:
         self.context = newc
 
     def to_dict(self, include_preferences=True):
-        res = {}
-
-        if include_preferences:
-            for k, v in self.preferences.items():
-                res[k] = v
-
-        for k, v in self.context.items():
-            if k != 'buffer':
-                res[k] = v
-
+        res = dict(self.preferences) if include_preferences else {}
+        res.update(self._other)
+        res.update(self._images)
+        res.update(self._audios)
+        res.pop('buffer', None)
         return res
 
-    def images(self) -> dict[str, str]:
-        return {
-            k: v for k, v in self.context.items()
-            if k.endswith('_image') and v is not None
-        }
+    def images(self) -> Mapping[str, str]:
+        """
+        a live, read-only view of the (non-empty) images in the context
+        """
+        return types.MappingProxyType(self._images)
 
-    def audios(self) -> dict[str, str]:
-        return {
-            k: v for k, v in self.context.items()
-            if k.endswith('_audio') and v is not None
-        }
+    def audios(self) -> Mapping[str, str]:
+        """
+        a live, read-only view of the (non-empty) audios in the context
+        """
+        return types.MappingProxyType(self._audios)
 
     def set_preference(self, key, val):
         self.preferences[key] = val
 
 
 class CachedSession(Session):
+    __slots__ = ('_dirty_ctx', '_dirty_prefs')
+
     def __init__(self, chat_session, chat_id):
         super().__init__(user_id=chat_session.get('external_user_id'),
                          chat_id=chat_id,
                          context=chat_session.get('context'),
                          preferences=chat_session.get('preferences'),
                          )
-        self.dirty = False
+        # keys changed since the last persist
+        self._dirty_ctx = set()
+        self._dirty_prefs = set()
+
+    @property
+    def dirty(self):
+        return len(self._dirty_ctx) > 0 or len(self._dirty_prefs) > 0
 
     def pop(self, key):
-        if key in self.context:
-            self.dirty = True
+        if self._find(key) is not None:
+            self._dirty_ctx.add(key)
         return super().pop(key)
 
     def persist(self, db):
-        if self.dirty:  # commit changes
-            db.set_chat_context(self.user_id, self.context, self.preferences)
-            self.dirty = False
+        """
+        writes only the keys that changed since the last persist (removed keys are sent as None)
+        """
+        if not self.dirty:
+            return
+
+        db.set_chat_context_partial(
+            self.user_id,
+            {k: self._peek(k) for k in self._dirty_ctx},
+            {k: self.preferences.get(k) for k in self._dirty_prefs},
+        )
+        self._dirty_ctx.clear()
+        self._dirty_prefs.clear()
 
     def set_preference(self, key, val):
         if self.preferences.get(key) != val:
-            self.dirty = True
+            self._dirty_prefs.add(key)
         super().set_preference(key, val)
 
     def set(self, key, value):
-        if self.context.get(key) != value:
-            self.dirty = True
+        if self._peek(key) != value:
+            self._dirty_ctx.add(key)
         super().set(key, value)
 
     def clear(self, clear_user=False):
-        if len(self.context) > 0:
-            self.dirty = True
+        self._dirty_ctx.update(self.context.keys())
         super().clear(clear_user)
 
     @classmethod
@@ -196,33 +322,72 @@ class MessageHandler:
 
     def listen(self, bot):
         self.sender_loop = asyncio.new_event_loop()
+        # at most bot.concurrency messages are in flight, each waiting on at most one blocking call at a time
+        executor = ThreadPoolExecutor(max_workers=bot.concurrency, thread_name_prefix='handler')
+        self.sender_loop.set_default_executor(executor)
 
         asyncio.set_event_loop(self.sender_loop)
-        self.sender_loop.run_until_complete(self._poll(bot))
+        try:
+            self.sender_loop.run_until_complete(self._poll(bot))
+        finally:
+            executor.shutdown(wait=False)
 
     def stop(self):
-        self.running = False
-        self.sender_loop.stop()
+        self.running = False  # _poll stops taking messages and returns once the in-flight ones are done
 
 
     async def _poll(self, bot):
-        while self.running:
-            try:
-                message = bot.internal_queue.get()
-                await self._handle_message(message, bot)
-            except (KeyboardInterrupt, SystemExit):
-                print("Shutting down...")
-                self.running = False
-                return
-            except Exception:
-                traceback.print_exc()
-                bot.metrics.capture_exception(exc_info(), 'anonymous')
-            finally:
-                bot.internal_queue.task_done()
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(bot.concurrency)
+        tasks = set()
+
+        # warm up the messaging service, if this fails the first message to need it tries again
+        try:
+            await bot.messaging_service.initialize()
+        except Exception:
+            traceback.print_exc()
+            bot.metrics.capture_exception(exc_info(), 'anonymous')
+
+        # intake gets its own thread, so it never queues up behind slow db or model calls on the default executor
+        intake = ThreadPoolExecutor(max_workers=1, thread_name_prefix='intake')
+        try:
+            while self.running:
+                for message in await loop.run_in_executor(intake, bot.inbox.take, 1):
+                    await slots.acquire()
+                    task = asyncio.create_task(self._dispatch(message, bot))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    task.add_done_callback(lambda _: slots.release())
+
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            intake.shutdown(wait=False)
+
+        try:
+            await bot.messaging_service.shutdown()
+        except Exception:
+            traceback.print_exc()
+
+    async def _dispatch(self, message: Message, bot):
+        try:
+            await self._handle_message(message, bot)
+        except (KeyboardInterrupt, SystemExit):
+            print("Shutting down...")
+            self.running = False
+        except Exception:
+            traceback.print_exc()
+            bot.metrics.capture_exception(exc_info(), 'anonymous')
+        finally:
+            message.release()
 
     async def _handle_message(self, message: Message, bot):
         print('on_message', message.__str__())
-        session = CachedSession.from_cache(
+        # every message shares this loop, so anything blocking (db, translation) runs on the executor
+        loop = asyncio.get_running_loop()
+        session = await _run_in_executor(
+            loop,
+            CachedSession.from_cache,
             db=bot.db,
             user_id=message.user_id,
             chat_id=message.chat_id)
@@ -232,7 +397,9 @@ class MessageHandler:
         })
 
         try:
-            bot.db.save_message(
+            await _run_in_executor(
+                loop,
+                bot.db.save_message,
                 user_id=message.user_id,
                 chat_id=message.chat_id,
                 text=message.text or '',
@@ -247,7 +414,7 @@ class MessageHandler:
             bot.metrics.capture_exception(e, session.user_id)
 
         if session.user_id is None:
-            session = bot.db.create_or_get_chat_session(message.user_id)
+            session = await _run_in_executor(loop, bot.db.create_or_get_chat_session, message.user_id)
             print(session)
             session.chat_id = message.chat_id
             session.user_id = session.get('external_user_id', None)
@@ -256,7 +423,8 @@ class MessageHandler:
             print("Loading reply...")
             message.reply_to_message = await bot.messaging_service.get_message(message.reply_to_message_id)
 
-        message.translate(bot.translator)
+        if bot.translator and not isinstance(bot.translator, NullTranslator):
+            await _run_in_executor(loop, message.translate, bot.translator)
 
         await self.process(message, session, bot)
 
@@ -266,6 +434,9 @@ class MessagingService:
     async def initialize(self):
         raise NotImplementedError()
 
+    async def shutdown(self):
+        pass  # nothing to release by default
+
     async def get_file(self, file_id) -> (str, bytes):
         raise NotImplementedError()
 
@@ -305,15 +476,17 @@ class BaseBot:
                  messaging_service: MessagingService,
                  db,
                  storage=None,
-                 internal_queue=None,
                  bot_id=None,
                  bot_language='en',
                  cache=None,
                  translator=None,
                  metrics=None,
+                 concurrency=32,
+                 max_queue_size=10_000,
+                 shutdown_timeout=30,
+                 shutdown_hooks=None,
                  ):
         self.messaging_service = messaging_service
-        self.internal_queue = internal_queue or queue.Queue()
         self.translator = translator
         self.db = db
         self.storage = storage
@@ -325,11 +498,14 @@ class BaseBot:
         self.models = {}
         self.handler_fn = handler_fn
 
-        self.senders = [handler_fn() for _ in range(int(os.cpu_count()))]
+        self.inbox = Inbox(max_size=max_queue_size)
+        self.concurrency = concurrency  # max messages being handled at the same time
+        self.shutdown_timeout = shutdown_timeout  # seconds to wait for in-flight messages on the way out
+        self.shutdown_hooks = shutdown_hooks or []  # called once the handler is done, e.g. to close http clients
 
-        self.threads = [
-            threading.Thread(target=handler.listen, args=(self,), daemon=True) for handler in self.senders
-        ]
+        # a single handler runs every message as a task on its own loop
+        self.handler = handler_fn()
+        self.thread = threading.Thread(target=self.handler.listen, args=(self,), daemon=True)
 
     async def initialize(self):
         raise NotImplementedError()
@@ -339,16 +515,31 @@ class BaseBot:
 
     def listen(self):
         # initialize the bot commands list and stuff
-        loop = asyncio.new_event_loop()
-        loop.run_until_complete(self.initialize())
-        loop.close()
+        asyncio.run(self.initialize())
 
         # start everything
-        [t.start() for t in self.threads]
+        self.thread.start()
         print("Bot ready")
         self.start()
         print("blowing things up, stay calm...")
-        [s.stop() for s in self.senders]
+        self.handler.stop()
+        self.thread.join(self.shutdown_timeout)
+
+        for hook in self.shutdown_hooks:
+            try:
+                hook()
+            except Exception:
+                traceback.print_exc()
 
     async def enqueue(self, update):
-        self.internal_queue.put(update)
+        try:
+            self.inbox.put(update, block=False)
+        except queue.Full:
+            self.metrics.send_event(
+                event="queue_full",
+                params={
+                    'pending': len(self.inbox),
+                }
+            )
+            # wait for room on an executor thread, so the loop keeps serving everything else
+            await _run_in_executor(asyncio.get_running_loop(), self.inbox.put, update)
@@ -3,7 +3,7 @@ import traceback
 from sys import exc_info
 from typing import Optional
 
-from cliobot.bots import Message, CachedSession, MessageHandler
+from cliobot.bots import Message, CachedSession, MessageHandler, _run_in_executor
 from cliobot.commands import BaseCommand
 
 class CommandHandler(MessageHandler):
@@ -49,7 +49,7 @@ class CommandHandler(MessageHandler):
             traceback.print_exc()
             bot.metrics.capture_exception(exc_info(), session.user_id)
         finally:
-            session.persist(bot.db)
+            await _run_in_executor(asyncio.get_running_loop(), session.persist, bot.db)
 
     async def process(self, message: Message, session: CachedSession, bot):
         inf = self.infer_command(message, session)
@@ -0,0 +1,43 @@
+import queue
+import threading
+
+
+class Inbox:
+    """
+    a bounded swap-buffer queue: producers append to a list, the consumer takes everything queued so far in one go,
+    so a burst of updates costs a single lock round-trip on the consumer side.
+
+    At most max_size updates are buffered; put() blocks (or raises queue.Full) beyond that.
+    """
+
+    def __init__(self, max_size=10_000):
+        self.max_size = max_size
+        self._buf = []
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+
+    def __len__(self):
+        return len(self._buf)
+
+    def put(self, item, block=True):
+        with self._not_full:
+            while len(self._buf) >= self.max_size:
+                if not block:
+                    raise queue.Full()
+                self._not_full.wait()
+
+            self._buf.append(item)
+            self._not_empty.notify()
+
+    def take(self, timeout=None) -> list:
+        """
+        waits until something's available (or the timeout expires) and returns everything queued so far
+        """
+        with self._not_empty:
+            if not self._buf:
+                self._not_empty.wait(timeout)
+
+            batch, self._buf = self._buf, []
+            self._not_full.notify(len(batch))
+            return batch
@@ -1,4 +1,4 @@
-import contextvars
+import asyncio
 from pathlib import Path
 
 import httpcore
@@ -10,7 +10,7 @@ from telegram.error import BadRequest, TimedOut, Forbidden
 from telegram.ext import ApplicationBuilder, ConversationHandler, MessageHandler, CallbackQueryHandler, \
     filters
 
-from cliobot.bots import Message, User, MessagingService, BaseBot
+from cliobot.bots import Message, User, MessagingService, BaseBot, _run_in_executor
 from cliobot.bots.command_handler import CommandHandler
 from cliobot.errors import TransientFailure, UserBlocked, UnknownError, MessageNoLongerExists, MessageNotModifiable
 from cliobot.utils import flatten
@@ -117,23 +117,34 @@ def parse_callback_string(callback_data):
     return {}
 
 
-threadlocal_bot = contextvars.ContextVar("bot_instance", default=None)
-
-
 class TelegramMessagingService(MessagingService):
     def __init__(self, apikey, db):
         self.apikey = apikey
         self.bot_id = telegram_bot_id(apikey)
         self.db = db
+        self.bot = None  # only ever used from the handler loop, shared by every message handled there
+        self._init_lock = None
 
     async def initialize(self) -> Bot:
-        if not threadlocal_bot.get():
-            threadlocal_bot.set(Bot(self.apikey))
+        if self.bot is not None and self.bot._initialized:
+            return self.bot
+
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+
+        # concurrent tasks wait for the same round-trip, a failed one is retried on next use
+        async with self._init_lock:
+            if self.bot is None:
+                self.bot = Bot(self.apikey)
+
+            if not self.bot._initialized:
+                await self.bot.initialize()
 
-        if not threadlocal_bot.get()._initialized:
-            await threadlocal_bot.get().initialize()
+        return self.bot
 
-        return threadlocal_bot.get()
+    async def shutdown(self):
+        if self.bot is not None and self.bot._initialized:
+            await self.bot.shutdown()
 
     @convert_exceptions
     @retry(TimedOut, tries=2, delay=0.5)
@@ -200,7 +211,9 @@ class TelegramMessagingService(MessagingService):
             reply_markup=reply_markup(reply_buttons) or buttons_markup(buttons),
         )
 
-        self.db.save_message(
+        await _run_in_executor(
+            asyncio.get_running_loop(),
+            self.db.save_message,
             user_id=self.bot_id,
             chat_id=chat_id,
             text=text or '',
@@ -238,7 +251,9 @@ class TelegramMessagingService(MessagingService):
             reply_markup=reply_markup(reply_buttons) or buttons_markup(buttons),
         )
 
-        self.db.save_message(
+        await _run_in_executor(
+            asyncio.get_running_loop(),
+            self.db.save_message,
             user_id=self.bot_id,
             chat_id=chat_id,
             text=text or '',
@@ -355,20 +370,22 @@ class TelegramBot(BaseBot):
         # sharing a bot between threads blows things up
         await bot.initialize()
 
-        if isinstance(self.senders[0], CommandHandler):
+        if isinstance(self.handler, CommandHandler):
             await bot.set_my_commands(
                 commands=[
                     BotCommand(
                         c.command,
                         c.description,
-                    ) for c in self.senders[0].commands
+                    ) for c in self.handler.commands
                 ])
 
     def start(self):
+        # asyncio.run() in listen() leaves the main thread without a current loop, which run_polling expects
+        asyncio.set_event_loop(asyncio.new_event_loop())
         self.app.run_polling()
 
     async def _parse_message(self, message, user, chat, context, callback_query) -> Message:
-        meta = {}
+        meta = None
 
         # text
         if message is not None:
@@ -425,7 +442,7 @@ class TelegramBot(BaseBot):
             voice = message.voice.file_id
 
         phone = message.contact.phone_number if message.contact and message.contact.user_id == user.id else None
-        return Message(
+        return Message.acquire(
             user=User(
                 username=user.username,
                 phone=phone,
@@ -442,6 +459,6 @@ class TelegramBot(BaseBot):
             audio=audio,
             voice=voice,
             video=video,
-            metadata=meta,
+            metadata=meta or None,  # lets a pooled message reuse its own dict
             is_forward=message.forward_from is not None,
         )
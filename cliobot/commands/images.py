@@ -1,7 +1,12 @@
+import asyncio
+
+from cliobot.bots import _run_in_executor
 from cliobot.commands import send_error_message_image, ModelBackedCommand
 from cliobot.db.utils import upload_asset, cached_get_file
 from cliobot.utils import abs_path
 
+WORKING_IMAGE = abs_path('working.jpg')
+
 
 class TextToImage(ModelBackedCommand):
     def __init__(self, models, default_model):
@@ -21,7 +26,7 @@ class TextToImage(ModelBackedCommand):
             text="Generating image, please wait...",
             chat_id=message.chat_id,
             media={
-                'image': abs_path('working.jpg'),
+                'image': WORKING_IMAGE,
             },
             reply_to_message_id=message.message_id,
         )
@@ -30,7 +35,9 @@ class TextToImage(ModelBackedCommand):
             res = await model.generate(parsed)
             images = res.images
             for r in images:
-                upload_asset(
+                await _run_in_executor(
+                    asyncio.get_running_loop(),
+                    upload_asset,
                     session=session,
                     local_path=r.url,
                     db=bot.db,
@@ -1,5 +1,4 @@
 import os
-import queue
 import re
 
 import i18n
@@ -151,6 +150,7 @@ class ConfigLoader:
                 if h:
                     h[v['model']] = m
 
+        shutdown_hooks = []
         if self.config.get('openai', None):
             print("**** Using OpenAI API ****")
             from cliobot.openai.client import OpenAIClient, GPTPrompt, Whisper1, Dalle3, Gpt4Vision
@@ -159,6 +159,7 @@ class ConfigLoader:
                 endpoints=self.config['openai']['endpoints'],
                 metrics=metrics,
             )
+            shutdown_hooks.append(openai_client.close)
 
             models = self.config['openai']['models']
             if 'dall-e-3' in models:
@@ -213,8 +214,6 @@ class ConfigLoader:
             ))
         commands.append(Help(commands))
 
-        self.internal_queue = queue.Queue()
-
         i18n.load_path.append(abs_path('i18n'))
         i18n.set('filename_format', '{locale}.{format}')
 
@@ -238,7 +237,6 @@ class ConfigLoader:
             apikey = self.config['bot']['token']
 
             return TelegramBot(
-                internal_queue=self.internal_queue,
                 db=db,
                 storage=storage,
                 translator=translator,
@@ -247,6 +245,7 @@ class ConfigLoader:
                 cache=cache,
                 metrics=metrics,
                 handler_fn=handler,
+                shutdown_hooks=shutdown_hooks,
             )
         else:
             raise Exception('unsupported platform:', plat)
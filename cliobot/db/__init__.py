@@ -6,6 +6,12 @@ class Database:
     def set_chat_context(self, user_id, context, preferences):
         raise NotImplementedError()
 
+    def set_chat_context_partial(self, user_id, context, preferences):
+        """
+        updates only the given context/preferences keys, replacing each value as a whole. A None value removes the key
+        """
+        raise NotImplementedError()
+
     def create_or_get_chat_session(self, user_id):
         raise NotImplementedError()
 
@@ -20,6 +20,14 @@ class InMemoryDb(Database):
     def set_chat_context(self, user_id, context, preferences):
         self.chats[user_id] = context
 
+    def set_chat_context_partial(self, user_id, context, preferences):
+        ctx = self.chats.setdefault(user_id, {})
+        for k, v in context.items():
+            if v is None:
+                ctx.pop(k, None)
+            else:
+                ctx[k] = v
+
     def create_or_get_chat_session(self, user_id):
         return Session(
             user_id=user_id,
@@ -57,6 +57,16 @@ class SqliteDb(Database):
         )
         self.conn.commit()
 
+    def set_chat_context_partial(self, user_id, context, preferences):
+        context_sql, context_args = json_update('context', context)
+        preferences_sql, preferences_args = json_update('preferences', preferences)
+        cur = self.conn.cursor()
+        cur.execute(
+            f"UPDATE chat_sessions SET context = {context_sql}, preferences = {preferences_sql} WHERE external_user_id = ?",
+            (*context_args, *preferences_args, user_id)
+        )
+        self.conn.commit()
+
     def get_asset(self, external_id, user_id, chat_id) -> Optional[dict]:
         cur = self.conn.cursor()
         cur.execute(
@@ -86,3 +96,32 @@ class SqliteDb(Database):
 def dict_factory(cursor, row):
     fields = [column[0] for column in cursor.description]
     return {key: value for key, value in zip(fields, row)}
+
+
+def json_update(column, changes):
+    """
+    builds a json_remove/json_set expression that replaces the given top-level keys of a json column as a whole
+    (a None value removes the key)
+
+    :return: the sql expression and its arguments
+    """
+    sql, args = column, []
+
+    removed = [k for k, v in changes.items() if v is None]
+    if removed:
+        sql = f"json_remove({sql}, {', '.join(['?'] * len(removed))})"
+        args.extend(json_path(k) for k in removed)
+
+    updated = [(k, v) for k, v in changes.items() if v is not None]
+    if updated:
+        sql = f"json_set({sql}, {', '.join(['?, json(?)'] * len(updated))})"
+        for k, v in updated:
+            args.extend((json_path(k), json.dumps(v)))
+
+    return sql, args
+
+
+def json_path(key):
+    if '"' in key:  # can't be quoted in a sqlite json path, and would be silently ignored
+        raise ValueError(f'unsupported key: {key}')
+    return f'$."{key}"'
@@ -1,9 +1,11 @@
+import asyncio
 import mimetypes
 import os
 from pathlib import Path
 
 import requests
 
+from cliobot.bots import _run_in_executor
 from cliobot.utils import md5_hash, abs_path, base64_to_bytes
 
 
@@ -29,17 +31,21 @@ async def cached_get_file(file_id, bot, session) -> Path:
     if os.path.exists(af):
         return Path(af)
 
-    os.makedirs(os.path.dirname(af), exist_ok=True)
+    loop = asyncio.get_running_loop()
     try:
-        data = get_data(file_id)
+        data = await _run_in_executor(loop, get_data, file_id)
     except FileNotFoundError as e:
         _, data = await bot.messaging_service.get_file(file_id)
 
+    await _run_in_executor(loop, _save, af, data)
+    return Path(af)
+
+
+def _save(af, data):
+    os.makedirs(os.path.dirname(af), exist_ok=True)
     with open(af, 'wb') as f:
         f.write(data)
 
-    return Path(af)
-
 
 def get_data(filepath):
     if filepath.startswith('data:'):
@@ -1,8 +1,10 @@
+import asyncio
 import json
 from typing import Optional
 
 import requests
 
+from cliobot.bots import _run_in_executor
 from cliobot.commands import Model, GenerationResults, BasePrompt
 from cliobot.utils import decode_image
 
@@ -19,6 +21,12 @@ class OllamaText(Model):
         self.endpoint = endpoint
 
     async def generate(self, parsed) -> GenerationResults:
+        response = await _run_in_executor(asyncio.get_running_loop(), self._generate, parsed)
+        return GenerationResults(
+            texts=[response.strip()]
+        )
+
+    def _generate(self, parsed) -> str:
         params = {
             'model': parsed.model,
             'prompt': parsed.prompt,
@@ -44,6 +52,4 @@ class OllamaText(Model):
             if 'error' in body:
                 raise Exception(body['error'])
 
-        return GenerationResults(
-            texts=[response.strip()]
-        )
+        return response
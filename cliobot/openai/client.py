@@ -1,9 +1,12 @@
+import asyncio
 from pathlib import Path
 from typing import Optional
 
+import httpx
 import openai
 from pydantic import Field
 
+from cliobot.bots import _run_in_executor
 from cliobot.commands import BasePrompt, Model, GenerationResults, ImageUrl
 from cliobot.utils import image_to_base64, open_image, decode_image
 
@@ -28,7 +31,7 @@ class Whisper1(Model):
         )
 
     async def generate(self, parsed) -> GenerationResults:
-        txt = self.openai_client.transcribe(parsed.audio)
+        txt = await _run_in_executor(asyncio.get_running_loop(), self.openai_client.transcribe, parsed.audio)
         return GenerationResults(texts=[txt])
 
 
@@ -40,8 +43,10 @@ class GPTPrompt(Model):
         self.openai_client = openai_client
 
     async def generate(self, parsed):
-        res = self.openai_client.ask(
-            parsed.prompt
+        res = await _run_in_executor(
+            asyncio.get_running_loop(),
+            self.openai_client.ask,
+            parsed.prompt,
         )
         return GenerationResults(texts=[res])
 
@@ -59,7 +64,9 @@ class Dalle3(Model):
         self.openai_client = openai_client
 
     async def generate(self, parsed) -> GenerationResults:
-        res = self.openai_client.dalle3_txt2img(
+        res = await _run_in_executor(
+            asyncio.get_running_loop(),
+            self.openai_client.dalle3_txt2img,
             prompt=parsed.prompt,
             num=1,
             size=parsed.size,
@@ -89,7 +96,9 @@ class Gpt4Vision(Model):
         self.openai_client = openai_client
 
     async def generate(self, parsed) -> GenerationResults:
-        res = self.openai_client.img2text(
+        res = await _run_in_executor(
+            asyncio.get_running_loop(),
+            self.openai_client.img2text,
             prompt=parsed.prompt,
             image_url=parsed.image,
         )
@@ -111,14 +120,25 @@ def dalle_size(size):
 class OpenAIClient:
     # OpenAI wrapper that supports multiple regions and a mix of azure + openai apis
 
-    def __init__(self, endpoints, metrics):
+    def __init__(self, endpoints, metrics, max_connections=100, max_keepalive_connections=20):
         self.metrics = metrics
 
+        # one connection pool for every endpoint client (the limits are openai's defaults). httpx pools per origin,
+        # so this only helps endpoints on the same host, eg. several azure deployments of one resource: they share
+        # warm connections and a single connection limit instead of one pool each
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+
         self.v1_configs = [v for v in endpoints if v['api_type'] == 'open_ai']
         self.v1_clients = [
             openai.OpenAI(
                 api_key=v['api_key'],
                 base_url=v['base_url'],
+                http_client=self.http_client,
             ) for v in self.v1_configs]
 
         self.azure_configs = [v for v in endpoints if v['api_type'] == 'azure']
@@ -127,8 +147,12 @@ class OpenAIClient:
                 api_key=v['api_key'],
                 azure_endpoint=v['base_url'],
                 api_version=v['api_version'],
+                http_client=self.http_client,
             ) for v in self.azure_configs]
 
+    def close(self):
+        self.http_client.close()
+
     def transcribe(self, audio_file):
         if isinstance(audio_file, str):
             audio_file = Path(audio_file)
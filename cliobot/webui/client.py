@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import io
 import os.path
@@ -6,6 +7,7 @@ import random
 import requests
 from PIL import Image
 
+from cliobot.bots import _run_in_executor
 from cliobot.commands import Model, BasePrompt, GenerationResults
 from cliobot.utils import base64_to_bytes, abs_path
 
@@ -71,12 +73,13 @@ class WebuiClient:
             'sampler_name': parsed.sampler,
         }  # TODO previews
 
-        r = self._post(f'/sdapi/v1/txt2img', params)
+        loop = asyncio.get_running_loop()
+        r = await _run_in_executor(loop, self._post, f'/sdapi/v1/txt2img', params)
 
         imgs = []
 
         for i in r['images']:
-            path = save_image(i, self.temp_dir)
+            path = await _run_in_executor(loop, save_image, i, self.temp_dir)
             imgs.append({
                 'url': path,
                 'prompt': parsed.prompt,
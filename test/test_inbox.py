@@ -0,0 +1,75 @@
+import asyncio
+import queue
+import threading
+import time
+import unittest
+from unittest import mock
+
+from cliobot.bots import BaseBot, MessageHandler
+from cliobot.bots.inbox import Inbox
+
+
+class TestInbox(unittest.TestCase):
+
+    def test_put_full(self):
+        inbox = Inbox(max_size=2)
+        inbox.put(1, block=False)
+        inbox.put(2, block=False)
+
+        with self.assertRaises(queue.Full):
+            inbox.put(3, block=False)
+        self.assertEqual(len(inbox), 2)
+
+    def test_blocked_put_wakes_up(self):
+        inbox = Inbox(max_size=1)
+        inbox.put(1)
+
+        t = threading.Thread(target=inbox.put, args=(2,))
+        t.start()
+        time.sleep(0.1)
+        self.assertTrue(t.is_alive())  # no room yet
+
+        self.assertEqual(inbox.take(), [1])
+        t.join(1)
+        self.assertFalse(t.is_alive())
+        self.assertEqual(inbox.take(), [2])
+
+    def test_take_timeout(self):
+        inbox = Inbox()
+
+        start = time.monotonic()
+        self.assertEqual(inbox.take(timeout=0.1), [])
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_take_burst(self):
+        inbox = Inbox()
+        for i in range(5):
+            inbox.put(i)
+
+        self.assertEqual(inbox.take(), [0, 1, 2, 3, 4])
+        self.assertEqual(len(inbox), 0)
+
+
+class TestEnqueue(unittest.IsolatedAsyncioTestCase):
+
+    async def test_queue_full(self):
+        metrics = mock.Mock()
+        bot = BaseBot(
+            handler_fn=MessageHandler,
+            messaging_service=mock.Mock(),
+            db=mock.Mock(),
+            metrics=metrics,
+            max_queue_size=1,
+        )
+
+        await bot.enqueue(1)
+        metrics.send_event.assert_not_called()
+
+        pending = asyncio.create_task(bot.enqueue(2))
+        await asyncio.sleep(0.1)
+        metrics.send_event.assert_called_once_with(event="queue_full", params={'pending': 1})
+        self.assertFalse(pending.done())  # waits for room instead of dropping the update
+
+        self.assertEqual(bot.inbox.take(), [1])
+        await asyncio.wait_for(pending, 1)
+        self.assertEqual(bot.inbox.take(), [2])
@@ -0,0 +1,52 @@
+import unittest
+
+from cliobot.bots import Message, User
+
+
+class TestMessage(unittest.TestCase):
+
+    def setUp(self):
+        Message._pool.clear()
+
+    def test_acquire_release(self):
+        reply = Message.acquire(message_id='1', user_id='123', chat_id='456', user=None, text='original')
+        msg = Message.acquire(
+            message_id='2',
+            user_id='123',
+            chat_id='456',
+            user=User('user', None, None, 'en'),
+            reply_to_message=reply,
+            text='/image a hamster',
+            image='img',
+            audio='audio',
+            voice='voice',
+            video='video',
+            bot_id='bot',
+            metadata={'command': 'select'},
+            is_forward=True,
+        )
+        metadata = msg.metadata
+
+        msg.release()  # releases the reply too
+        self.assertEqual(len(Message._pool), 2)
+
+        for m in (msg, reply):
+            for attr in Message.__slots__:
+                if attr == 'metadata':
+                    self.assertEqual(m.metadata, {})
+                elif attr == 'is_forward':
+                    self.assertFalse(m.is_forward)
+                else:
+                    self.assertIsNone(getattr(m, attr), attr)
+
+        recycled = [
+            Message.acquire(message_id='3', user_id='123', chat_id='456', user=None),
+            Message.acquire(message_id='4', user_id='123', chat_id='456', user=None),
+        ]
+        self.assertIn(msg, recycled)
+        self.assertIn(reply, recycled)
+        self.assertIs(msg.metadata, metadata)  # the cleared dict is reused
+        self.assertEqual(len(Message._pool), 0)
+
+        fresh = Message.acquire(message_id='5', user_id='123', chat_id='456', user=None)
+        self.assertNotIn(fresh, recycled)
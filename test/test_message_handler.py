@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from cliobot.bots import BaseBot, MessageHandler, MessagingService, Message
+
+
+class StubMessagingService(MessagingService):
+
+    def __init__(self):
+        self.shut_down = False
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        self.shut_down = True
+
+
+class StubHandler(MessageHandler):
+
+    def __init__(self):
+        super().__init__()
+        self.delay = 0.05
+        self.active = 0
+        self.peak = 0
+        self.started = []
+        self.finished = []
+
+    async def process(self, message: Message, session, bot):
+        self.started.append(message.message_id)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if message.text == 'boom':
+                raise Exception('boom')
+        finally:
+            self.active -= 1
+        self.finished.append(message.message_id)
+
+
+def msg(i, text='hello'):
+    return Message.acquire(message_id=str(i), user_id='123', chat_id='456', user=None, text=text)
+
+
+async def wait_until(cond, timeout=2):
+    async def _wait():
+        while not cond():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(_wait(), timeout)
+
+
+class TestMessageHandler(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        Message._pool.clear()
+
+        db = mock.Mock()
+        db.create_or_get_chat_session.return_value = {
+            'external_user_id': '123',
+            'context': {},
+            'preferences': {},
+        }
+        self.metrics = mock.Mock()
+        self.service = StubMessagingService()
+        self.bot = BaseBot(
+            handler_fn=StubHandler,
+            messaging_service=self.service,
+            db=db,
+            metrics=self.metrics,
+            concurrency=2,
+        )
+        self.handler = self.bot.handler
+
+    async def asyncSetUp(self):
+        self.poll = asyncio.create_task(self.handler._poll(self.bot))
+
+    async def asyncTearDown(self):
+        self.handler.stop()
+        await asyncio.wait_for(self.poll, 3)
+
+    async def test_concurrency_bound(self):
+        for i in range(6):
+            self.bot.inbox.put(msg(i))
+
+        await wait_until(lambda: len(self.handler.finished) == 6)
+        self.assertEqual(self.handler.peak, 2)
+        self.assertEqual(sorted(self.handler.finished), [str(i) for i in range(6)])
+
+    async def test_stop_waits_for_in_flight(self):
+        self.handler.delay = 0.3
+        for i in range(2):
+            self.bot.inbox.put(msg(i))
+
+        await wait_until(lambda: len(self.handler.started) == 2)
+        self.handler.stop()
+        await asyncio.wait_for(self.poll, 3)
+
+        self.assertEqual(len(self.handler.finished), 2)
+        self.assertTrue(self.service.shut_down)
+
+    async def test_release_after_dispatch(self):
+        ok, failing = msg(1), msg(2, text='boom')
+        self.bot.inbox.put(ok)
+        self.bot.inbox.put(failing)
+
+        await wait_until(lambda: len(Message._pool) == 2)
+        self.assertIn(ok, Message._pool)
+        self.assertIn(failing, Message._pool)  # released even when handling fails
+        self.assertIsNone(ok.text)
+        self.assertIsNone(failing.text)
+        self.metrics.capture_exception.assert_called_once()
@@ -0,0 +1,189 @@
+import json
+import unittest
+from unittest import mock
+
+from cliobot.bots import Session, CachedSession
+from cliobot.db import Database
+from cliobot.db.inmemory import InMemoryDb
+from cliobot.db.sqlite import SqliteDb
+
+
+class TestSession(unittest.TestCase):
+
+    def test_get(self):
+        session = Session(
+            user_id='123',
+            chat_id='456',
+            context={'count': 0, 'text': '', 'missing': None},
+            preferences={'count': 3, 'missing': 'pref', 'model': 'dalle3'},
+        )
+
+        self.assertEqual(session.get('count'), 0)  # falsy values are still values
+        self.assertEqual(session.get('text', 'default'), '')
+        self.assertEqual(session.get('missing'), 'pref')
+        self.assertEqual(session.get('model'), 'dalle3')
+        self.assertIsNone(session.get('model', include_preferences=False))
+        self.assertEqual(session.get('nope', 'default'), 'default')
+
+    def test_to_dict(self):
+        session = Session(
+            user_id='123',
+            chat_id='456',
+            context={'model': 'sdxl', 'buffer': 'ignored', 'a_image': 'img'},
+            preferences={'model': 'dalle3', 'size': '1024x1024'},
+        )
+
+        self.assertEqual(session.to_dict(), {'model': 'sdxl', 'size': '1024x1024', 'a_image': 'img'})
+        self.assertEqual(session.to_dict(include_preferences=False), {'model': 'sdxl', 'a_image': 'img'})
+
+    def test_set_moves_between_kinds(self):
+        session = Session(
+            user_id='123',
+            chat_id='456',
+            context={'a_image': 'img', 'b_audio': 'audio', 'model': 'sdxl', 'c_image': None},
+            preferences={},
+        )
+        self.assertEqual(dict(session.images()), {'a_image': 'img'})
+        self.assertEqual(dict(session.audios()), {'b_audio': 'audio'})
+
+        session.set('a_image', None)  # no longer an image, but still in the context
+        session.set('c_image', 'img2')
+        self.assertEqual(dict(session.images()), {'c_image': 'img2'})
+        self.assertIn('a_image', session.context)
+        self.assertIsNone(session.context['a_image'])
+
+        session.set('b_audio', 'audio2')
+        self.assertEqual(dict(session.audios()), {'b_audio': 'audio2'})
+        self.assertEqual(dict(session.context), {
+            'a_image': None, 'b_audio': 'audio2', 'model': 'sdxl', 'c_image': 'img2',
+        })
+
+    def test_pop(self):
+        session = Session(user_id='123', chat_id='456', context={'a_image': 'img', 'model': 'sdxl'}, preferences={})
+
+        self.assertEqual(session.pop('a_image'), 'img')
+        self.assertEqual(dict(session.images()), {})
+        self.assertEqual(session.pop('model'), 'sdxl')
+        self.assertIsNone(session.pop('model'))
+        self.assertEqual(dict(session.context), {})
+
+    def test_clear(self):
+        session = Session(user_id='123', chat_id='456', context={'a_image': 'img', 'b_audio': 'audio', 'model': 'sdxl'},
+                          preferences={'lang': 'en'})
+        context = session.context
+
+        session.clear()
+        self.assertEqual(dict(session.context), {})
+        self.assertEqual(dict(session.images()), {})
+        self.assertEqual(dict(session.audios()), {})
+        self.assertEqual(dict(context), {'a_image': 'img', 'b_audio': 'audio', 'model': 'sdxl'})  # old view untouched
+        self.assertEqual(session.preferences, {'lang': 'en'})
+
+    def test_context_is_read_only(self):
+        session = Session(user_id='123', chat_id='456', context={}, preferences={})
+
+        with self.assertRaises(TypeError):
+            session.context['model'] = 'sdxl'
+        with self.assertRaises(TypeError):
+            session.images()['a_image'] = 'img'
+
+        session.set('model', 'sdxl')
+        self.assertEqual(session.context['model'], 'sdxl')  # the view is live
+
+
+class TestCachedSession(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mock.Mock(Database)
+        self.session = CachedSession(
+            chat_session={
+                'external_user_id': '123',
+                'context': {'model': 'sdxl', 'a_image': 'img'},
+                'preferences': {'lang': 'en'},
+            },
+            chat_id='456',
+        )
+
+    def test_persist_nothing_changed(self):
+        self.session.set('model', 'sdxl')  # same value
+        self.session.set_preference('lang', 'en')
+        self.session.pop('nope')
+        self.assertFalse(self.session.dirty)
+
+        self.session.persist(self.db)
+        self.db.set_chat_context_partial.assert_not_called()
+
+    def test_persist_changed_keys(self):
+        self.session.set('model', 'dalle3')
+        self.session.set('prompt', 'a hamster')
+        self.session.pop('a_image')
+        self.session.set_preference('lang', 'br')
+        self.assertTrue(self.session.dirty)
+
+        self.session.persist(self.db)
+        self.db.set_chat_context_partial.assert_called_once_with(
+            '123',
+            {'model': 'dalle3', 'prompt': 'a hamster', 'a_image': None},
+            {'lang': 'br'},
+        )
+        self.assertFalse(self.session.dirty)
+
+        self.session.persist(self.db)  # nothing new
+        self.db.set_chat_context_partial.assert_called_once()
+
+    def test_persist_clear(self):
+        self.session.clear()
+
+        self.session.persist(self.db)
+        self.db.set_chat_context_partial.assert_called_once_with(
+            '123',
+            {'model': None, 'a_image': None},
+            {},
+        )
+
+
+class TestInMemoryChatContext(unittest.TestCase):
+
+    def test_set_chat_context_partial(self):
+        db = InMemoryDb()
+        db.set_chat_context('123', {'size': {'w': 1, 'h': 2}, 'a_image': 'img', 'model': 'sdxl'}, {})
+
+        db.set_chat_context_partial('123', {'size': {'w': 3}, 'a_image': None, 'prompt': 'a hamster'}, {})
+        self.assertEqual(db.chats['123'], {'size': {'w': 3}, 'model': 'sdxl', 'prompt': 'a hamster'})
+
+
+class TestSqliteChatContext(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SqliteDb(':memory:')
+        self.db.conn.execute(
+            "INSERT INTO chat_sessions (external_user_id, context, preferences) VALUES (?, ?, ?)",
+            ('123', json.dumps({'size': {'w': 1, 'h': 2}, 'a_image': 'img', 'model': 'sdxl'}),
+             json.dumps({'lang': 'en'}))
+        )
+
+    def chat_session(self):
+        res = self.db.conn.execute("SELECT * FROM chat_sessions WHERE external_user_id = ?", ('123',)).fetchone()
+        return json.loads(res['context']), json.loads(res['preferences'])
+
+    def test_set_chat_context_partial(self):
+        self.db.set_chat_context_partial(
+            '123',
+            {'size': {'w': 3}, 'a_image': None, 'tags': ['a', None], 'opts': {'x': None}},
+            {'model': 'dalle3'},
+        )
+
+        context, preferences = self.chat_session()
+        self.assertEqual(context, {
+            'size': {'w': 3},  # replaced, not merged
+            'model': 'sdxl',
+            'tags': ['a', None],
+            'opts': {'x': None},  # nested None values are kept
+        })
+        self.assertEqual(preferences, {'lang': 'en', 'model': 'dalle3'})
+
+    def test_set_chat_context_partial_noop(self):
+        self.db.set_chat_context_partial('123', {}, {})
+
+        context, _ = self.chat_session()
+        self.assertEqual(context['size'], {'w': 1, 'h': 2})